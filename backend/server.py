@@ -1,25 +1,122 @@
-from fastapi import FastAPI, File, UploadFile, HTTPException
+from fastapi import FastAPI, File, UploadFile, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse, Response
+from fastapi.responses import FileResponse, ORJSONResponse
+from starlette.background import BackgroundTask
 import os
+import logging
+import re
+import shutil
+import tempfile
+import hashlib
+import asyncio
+import multiprocessing
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from dotenv import load_dotenv
+import aiofiles
 import fitz  # PyMuPDF
-from PIL import Image, ImageDraw, ImageFont
+from PIL import Image
 import base64
 import io
 import uuid
 from pathlib import Path
-from typing import List, Dict, Any
-import traceback
-import json
+from typing import List, Dict, Optional, Tuple
 from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import letter
+from reportlab.lib.utils import ImageReader
 import math
 
 # Load environment variables
 load_dotenv()
 
-app = FastAPI(title="Interactive Weld Mapping Tool")
+# Diagnostics go through logging so the export path costs nothing at the
+# default WARNING level
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "WARNING").upper())
+logger = logging.getLogger(__name__)
+
+# Configuration
+UPLOAD_DIR = Path("/tmp/uploads")
+UPLOAD_DIR.mkdir(exist_ok=True)
+UPLOAD_CHUNK_SIZE = 1 << 20  # 1 MB
+
+# Page rendering: 2x for precise symbol placement, as JPEG by default;
+# HIGH_RES=1 keeps lossless PNG
+HIGH_RES = os.getenv("HIGH_RES", "0") == "1"
+RENDER_ZOOM = 2.0
+RENDER_MAX_EDGE = 4096  # Long-edge pixel cap, so A0/A1 sheets stay sane
+JPEG_QUALITY = 90
+PAGE_IMAGE_EXT = "png" if HIGH_RES else "jpg"
+
+# Export pages keep the size they always had (2x render at 0.75 pt/px), taken
+# from the source page rather than the raster, so symbol size relative to the
+# drawing never depends on resolution
+EXPORT_PAGE_SCALE = RENDER_ZOOM * 0.75
+
+# Uploaded PDFs are kept under UPLOAD_DIR/{file_id}/ and each page is rendered
+# there the first time its URL is requested, instead of every page up front.
+# file_id is derived from the PDF content and render settings, so the page sets
+# double as a cache.
+PAGE_IMAGE_ROUTE = "/api/images"
+PAGE_IMAGE_NAME = re.compile(r"page_(\d+)\.(jpg|png)")
+SOURCE_PDF_NAME = "source.pdf"
+FILE_ID_PATTERN = re.compile(r"[0-9a-f]{64}")
+RENDER_CACHE_MAX_DOCS = int(os.getenv("RENDER_CACHE_MAX_DOCS", "200"))
+RENDER_CACHE_MAX_BYTES = int(
+    os.getenv("RENDER_CACHE_MAX_BYTES", str(2 << 30))  # 2 GB
+)
+# Saved projects keep page URLs, which outlive the cache; re-uploading the same
+# PDF restores them
+PAGE_SET_EXPIRED = (
+    "This drawing's pages are no longer on the server. "
+    "Re-upload the PDF, then load the project again."
+)
+
+# Rasterization is CPU-bound, so pages render in worker processes off the event
+# loop. The pool is created on first use, so each uvicorn worker process owns
+# its own. By then the process is already running threads, so workers come from
+# a forkserver rather than a plain fork. The cores are split between the
+# uvicorn workers (same default as entrypoint.sh), so the pools together never
+# start more render processes than there are cores.
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "2"))
+PDF_POOL_WORKERS = max(1, (os.cpu_count() or 1) // WEB_CONCURRENCY)
+_PDF_POOL = None
+
+
+def _get_pdf_pool() -> ProcessPoolExecutor:
+    global _PDF_POOL
+    if _PDF_POOL is None:
+        _PDF_POOL = ProcessPoolExecutor(
+            max_workers=PDF_POOL_WORKERS,
+            mp_context=multiprocessing.get_context("forkserver")
+        )
+    return _PDF_POOL
+
+
+# Export builds (asyncio.to_thread) and aiofiles I/O share the event loop's
+# default executor; never smaller than asyncio's own min(32, cpu + 4)
+_CPU_COUNT = os.cpu_count() or 1
+THREAD_POOL_WORKERS = int(os.getenv(
+    "THREAD_POOL_WORKERS", min(32, max(_CPU_COUNT + 4, _CPU_COUNT * 2))
+))
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global _PDF_POOL
+    asyncio.get_running_loop().set_default_executor(
+        ThreadPoolExecutor(max_workers=THREAD_POOL_WORKERS)
+    )
+    yield
+    if _PDF_POOL is not None:
+        _PDF_POOL.shutdown(cancel_futures=True)
+        _PDF_POOL = None
+
+
+app = FastAPI(
+    title="Interactive Weld Mapping Tool",
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan
+)
 
 # CORS middleware
 app.add_middleware(
@@ -30,332 +127,679 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Configuration
-UPLOAD_DIR = Path("/tmp/uploads")
-UPLOAD_DIR.mkdir(exist_ok=True)
 
 @app.get("/api/health")
 async def health_check():
     return {"status": "healthy", "service": "Interactive Weld Mapping Tool"}
 
-def pdf_to_images(pdf_path: str) -> List[str]:
-    """Convert PDF pages to base64 encoded images"""
+
+def _render_page(doc: fitz.Document, page_num: int) -> bytes:
+    """Render a single PDF page to image bytes"""
+    page = doc.load_page(page_num)
+    long_edge = max(page.rect.width, page.rect.height)
+    zoom = min(RENDER_ZOOM, RENDER_MAX_EDGE / long_edge)
+    mat = fitz.Matrix(zoom, zoom)
+    # Drawings need no alpha channel; plain RGB keeps the pixmap at 3 bytes/px
+    pix = page.get_pixmap(matrix=mat, alpha=False, colorspace=fitz.csRGB)
+    if HIGH_RES:
+        return pix.tobytes("png")
+    # Line drawings survive JPEG well at a fraction of the PNG payload, and
+    # MuPDF encodes it itself, so the pixels never take a detour through Pillow
+    return pix.tobytes("jpeg", jpg_quality=JPEG_QUALITY)
+
+
+def _render_pages(pdf_path: str, page_nums: List[int]) -> Dict[int, bytes]:
+    """Render the listed pages off one open document, skipping any past the
+    end (runs in a worker process)"""
+    with fitz.open(pdf_path) as doc:
+        return {
+            page_num: _render_page(doc, page_num)
+            for page_num in page_nums if page_num < len(doc)
+        }
+
+
+def _count_pages(pdf_path: Path) -> int:
+    """Page count of a PDF; opening it also rejects files that aren't one"""
+    with fitz.open(str(pdf_path)) as doc:
+        return len(doc)
+
+
+def _render_cache_key(content_hash: str) -> str:
+    """Page set id for a document; render settings are part of the key"""
+    settings = (
+        f"{RENDER_ZOOM}:{RENDER_MAX_EDGE}:{PAGE_IMAGE_EXT}:{JPEG_QUALITY}"
+    )
+    return hashlib.sha256(f"{content_hash}:{settings}".encode()).hexdigest()
+
+
+def _store_source(page_dir: Path, file_path: Path):
+    """Move an upload into place as a page set's PDF at once, so a cached
+    page set always has its source"""
+    staging_dir = UPLOAD_DIR / f".{page_dir.name}.{uuid.uuid4().hex}"
+    staging_dir.mkdir()
     try:
-        doc = fitz.open(pdf_path)
-        images = []
-        
-        for page_num in range(len(doc)):
-            page = doc.load_page(page_num)
-            # High resolution for precise symbol placement
-            mat = fitz.Matrix(2.0, 2.0)  # 2x scaling for better quality
-            pix = page.get_pixmap(matrix=mat)
-            img_data = pix.tobytes("png")
-            
-            # Convert to base64
-            img_base64 = base64.b64encode(img_data).decode('utf-8')
-            images.append(img_base64)
-        
-        doc.close()
-        return images
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error converting PDF to images: {str(e)}")
+        file_path.rename(staging_dir / SOURCE_PDF_NAME)
+        try:
+            staging_dir.rename(page_dir)
+        except OSError:
+            # A concurrent upload of the same drawing stored it first
+            if not page_dir.is_dir():
+                raise
+    finally:
+        shutil.rmtree(staging_dir, ignore_errors=True)
+
+
+def _page_set_size(page_dir: str) -> int:
+    """Bytes on disk for one page set (its PDF plus pages rendered so far)"""
+    size = 0
+    for entry in os.scandir(page_dir):
+        try:
+            size += entry.stat().st_size
+        except FileNotFoundError:
+            continue
+    return size
+
+
+def _touch_page_set(page_dir: Path):
+    """Mark a page set as recently used, so eviction keeps drawings that are
+    still being worked on"""
+    try:
+        os.utime(page_dir)
+    except FileNotFoundError:
+        pass
+
+
+def _evict_render_cache():
+    """Drop the least recently used page sets beyond RENDER_CACHE_MAX_DOCS or
+    RENDER_CACHE_MAX_BYTES"""
+    page_dirs = []
+    for entry in os.scandir(UPLOAD_DIR):
+        if entry.is_dir() and FILE_ID_PATTERN.fullmatch(entry.name):
+            try:
+                page_dirs.append((entry.stat().st_mtime, entry.path))
+            except FileNotFoundError:
+                continue
+
+    # Directory mtime moves on uploads, page requests and exports
+    # (_touch_page_set); atime isn't used because relatime/noatime mounts
+    # barely update it
+    page_dirs.sort(reverse=True)
+    kept_bytes = 0
+    for index, (_, page_dir) in enumerate(page_dirs):
+        if index < RENDER_CACHE_MAX_DOCS:
+            try:
+                kept_bytes += _page_set_size(page_dir)
+            except FileNotFoundError:
+                continue
+            # The newest set is always kept, it belongs to the upload that
+            # triggered eviction
+            if index == 0 or kept_bytes <= RENDER_CACHE_MAX_BYTES:
+                continue
+        shutil.rmtree(page_dir, ignore_errors=True)
+
+
+async def _convert_uploaded_pdf(filename: str, save_upload) -> ORJSONResponse:
+    """Save an upload with save_upload(file_path) -> sha256 hex digest, then
+    convert it to page images"""
+    if not filename.lower().endswith('.pdf'):
+        raise HTTPException(
+            status_code=400, detail="Only PDF files are allowed"
+        )
 
-@app.post("/api/upload-pdf-only")
-async def upload_pdf_only(file: UploadFile = File(...)):
-    """Upload PDF and convert to images for interactive annotation"""
-    if not file.filename.lower().endswith('.pdf'):
-        raise HTTPException(status_code=400, detail="Only PDF files are allowed")
-    
     try:
         # Save uploaded file
-        file_id = str(uuid.uuid4())
-        file_path = UPLOAD_DIR / f"{file_id}.pdf"
-        
-        with open(file_path, "wb") as buffer:
-            content = await file.read()
-            buffer.write(content)
-        
-        # Convert PDF to images
-        images = pdf_to_images(str(file_path))
-        
-        # Clean up uploaded file
-        file_path.unlink()
-        
-        return JSONResponse({
+        file_path = UPLOAD_DIR / f"{uuid.uuid4()}.pdf"
+        content_hash = await save_upload(file_path)
+
+        # Re-uploading a drawing reuses its stored pages instead of rendering
+        # again
+        file_id = _render_cache_key(content_hash)
+        page_dir = UPLOAD_DIR / file_id
+        try:
+            # Only the page count is needed now; pages render when the
+            # browser first asks for them
+            total_pages = await asyncio.to_thread(_count_pages, file_path)
+            if page_dir.is_dir():
+                _touch_page_set(page_dir)
+            else:
+                _store_source(page_dir, file_path)
+                await asyncio.to_thread(_evict_render_cache)
+        finally:
+            file_path.unlink(missing_ok=True)
+
+        image_urls = [
+            f"{PAGE_IMAGE_ROUTE}/{file_id}/page_{page_num}.{PAGE_IMAGE_EXT}"
+            for page_num in range(total_pages)
+        ]
+
+        return ORJSONResponse({
             "success": True,
             "file_id": file_id,
-            "filename": file.filename,
-            "total_pages": len(images),
-            "images": images,
-            "message": "PDF loaded successfully. Use the interactive tool to place weld symbols."
+            "filename": filename,
+            "total_pages": total_pages,
+            "content_hash": content_hash,
+            "image_urls": image_urls,
+            "message": (
+                "PDF loaded successfully. "
+                "Use the interactive tool to place weld symbols."
+            )
         })
-        
+
     except Exception as e:
         # Clean up on error
-        if 'file_path' in locals() and file_path.exists():
-            file_path.unlink()
-            
-        raise HTTPException(status_code=500, detail=f"Error processing PDF: {str(e)}")
+        if 'file_path' in locals():
+            file_path.unlink(missing_ok=True)
 
-@app.post("/api/export-pdf")
-async def export_pdf_best_fidelity(export_data: dict):
-    """BEST VISUAL FIDELITY: Export PDF with exact editor matching - NO position shifting"""
+        raise HTTPException(
+            status_code=500, detail=f"Error processing PDF: {str(e)}"
+        )
+
+
+@app.post("/api/upload-pdf-only")
+async def upload_pdf_only(file: UploadFile = File(...)):
+    """Upload PDF and convert to images for interactive annotation"""
+    async def save_upload(file_path: Path) -> str:
+        # Stream to disk in chunks so large drawings never sit in memory whole,
+        # hashing on the way so the document key costs no second pass
+        digest = hashlib.sha256()
+        async with aiofiles.open(file_path, "wb") as buffer:
+            while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+                digest.update(chunk)
+                await buffer.write(chunk)
+        return digest.hexdigest()
+
+    return await _convert_uploaded_pdf(file.filename, save_upload)
+
+
+@app.post("/api/upload-pdf-raw")
+async def upload_pdf_raw(request: Request, filename: str):
+    """Upload a PDF sent as the raw request body (application/pdf).
+
+    Multipart uploads are spooled to a temp file before the handler runs and
+    then copied again; the raw body is written to disk as it arrives instead.
+    """
+    async def save_upload(file_path: Path) -> str:
+        digest = hashlib.sha256()
+        async with aiofiles.open(file_path, "wb") as buffer:
+            async for chunk in request.stream():
+                digest.update(chunk)
+                await buffer.write(chunk)
+        return digest.hexdigest()
+
+    return await _convert_uploaded_pdf(filename, save_upload)
+
+
+def _page_image_path(file_id: str, name: str) -> Path:
+    """Resolve a page image path, rejecting anything that isn't one"""
+    if not (FILE_ID_PATTERN.fullmatch(file_id)
+            and PAGE_IMAGE_NAME.fullmatch(name)):
+        raise HTTPException(status_code=404, detail="Page image not found")
+    return UPLOAD_DIR / file_id / name
+
+
+async def _ensure_page_image(file_id: str, name: str) -> Path:
+    """Resolve a page image, rendering it from the stored PDF the first time
+    it is requested"""
+    page_path = _page_image_path(file_id, name)
+    if page_path.is_file():
+        _touch_page_set(page_path.parent)
+        return page_path
+    if not page_path.parent.is_dir():
+        raise HTTPException(status_code=410, detail=PAGE_SET_EXPIRED)
+
+    source_path = page_path.with_name(SOURCE_PDF_NAME)
+    if not name.endswith(f".{PAGE_IMAGE_EXT}") or not source_path.is_file():
+        raise HTTPException(status_code=404, detail="Page image not found")
+
+    page_num = _page_number(name)
     try:
-        print("=== BEST VISUAL FIDELITY EXPORT STARTED ===")
-        
-        filename = export_data.get('filename', 'weld_mapping_high_fidelity')
-        symbols = export_data.get('symbols', [])
-        images = export_data.get('images', [])
-        canvas_specs = export_data.get('canvasSpecs', {})
-        fidelity_settings = export_data.get('fidelitySettings', {})
-        shape_specs = export_data.get('shapeSpecs', {})
-        
-        if not images:
-            raise HTTPException(status_code=400, detail="No images to export")
-        
-        # BEST VISUAL FIDELITY: Check if high fidelity mode is enabled
-        if fidelity_settings.get('bestVisualFidelity', False):
-            print("🎯 BEST VISUAL FIDELITY MODE ENABLED")
-            print(f"📊 Fidelity Settings: {fidelity_settings}")
-        
-        print(f"📋 Processing {len(symbols)} symbols for high fidelity export")
-        
-        # Create PDF buffer
-        buffer = io.BytesIO()
-        
-        # EXACT RESOLUTION MATCHING: Use original image dimensions
-        first_img_data = base64.b64decode(images[0])
-        first_img = Image.open(io.BytesIO(first_img_data))
-        original_width, original_height = first_img.size
-        
-        # EXACT SCALING: Match editor scaling exactly
-        if fidelity_settings.get('exactResolution', False):
-            # Use exact canvas dimensions from editor
-            canvas_width = canvas_specs.get('elementWidth', 800)
-            canvas_height = canvas_specs.get('elementHeight', 600)
-            
-            # Use exact editor scale factors
-            editor_scale_x = canvas_specs.get('editorScaleX', 1.0)
-            editor_scale_y = canvas_specs.get('editorScaleY', 1.0)
-            device_pixel_ratio = canvas_specs.get('devicePixelRatio', 1.0)
-            
-            # BEST VISUAL FIDELITY: Calculate PDF dimensions to match editor exactly
-            # Use a scaling factor that preserves the original image quality
-            pdf_scale_factor = 0.75  # Standard PDF points conversion
-            pdf_width = original_width * pdf_scale_factor
-            pdf_height = original_height * pdf_scale_factor
-            
-            # EXACT COORDINATE TRANSFORMATION: Match editor coordinate system exactly
-            # Scale from canvas coordinates to PDF coordinates using EXACT same ratios
-            coord_scale_x = pdf_width / canvas_width
-            coord_scale_y = pdf_height / canvas_height
-            
-            print(f"🎯 EXACT RESOLUTION MATCHING:")
-            print(f"   📐 Original Image: {original_width}x{original_height}")
-            print(f"   🖥️  Canvas: {canvas_width}x{canvas_height}")
-            print(f"   📄 PDF: {pdf_width}x{pdf_height}")
-            print(f"   🔧 Editor Scale: {editor_scale_x:.4f}x{editor_scale_y:.4f}")
-            print(f"   📏 Coord Scale: {coord_scale_x:.4f}x{coord_scale_y:.4f}")
-            print(f"   🖼️  Device Pixel Ratio: {device_pixel_ratio}")
-            
-        else:
-            # Fallback to standard scaling
-            canvas_width = canvas_specs.get('elementWidth', 800)
-            canvas_height = canvas_specs.get('elementHeight', 600)
-            pdf_width = original_width * 0.75
-            pdf_height = original_height * 0.75
-            coord_scale_x = pdf_width / canvas_width
-            coord_scale_y = pdf_height / canvas_height
-        
-        pdf_canvas = canvas.Canvas(buffer, pagesize=(pdf_width, pdf_height))
-        
-        # ANCHOR POINT CONSISTENCY: Define exact anchor points used in editor
-        anchor_points = {
-            'field_weld': 'center',    # Diamond centered
-            'shop_weld': 'center',     # Circle centered
-            'pipe_section': 'center',  # Rectangle centered
-            'pipe_support': 'center',  # Rectangle centered
-            'flange_joint': 'center'   # Hexagon centered
-        }
-        
-        # EXACT SHAPE SPECIFICATIONS: Match editor exactly
-        if fidelity_settings.get('matchEditorScaling', False):
-            base_size_pdf = 20  # Base size in PDF points
-            uniform_size_pdf = base_size_pdf * 0.8  # Match editor uniform size
-            stroke_width_pdf = 2  # Match editor stroke width
-        else:
-            base_size_pdf = 18
-            uniform_size_pdf = base_size_pdf * 0.8
-            stroke_width_pdf = 1.5
-        
-        # Color mapping (exact same as editor)
-        colors = {
-            'field_weld': (0, 0.4, 1),      # Blue
-            'shop_weld': (0, 0.4, 1),       # Blue  
-            'pipe_section': (0, 0.4, 1),    # Blue
-            'pipe_support': (1, 0, 0),      # Red
-            'flange_joint': (0, 0.4, 1)     # Blue
-        }
-        
-        # Process each page with BEST VISUAL FIDELITY
-        for page_num, image_base64 in enumerate(images):
-            print(f"📄 Processing page {page_num + 1} with BEST VISUAL FIDELITY")
-            
-            # Process background image with exact quality
-            img_data = base64.b64decode(image_base64)
-            img = Image.open(io.BytesIO(img_data))
-            
-            if img.mode != 'RGB':
-                img = img.convert('RGB')
-            
-            # BEST VISUAL FIDELITY: High quality image rendering
-            temp_file = f"/tmp/hq_export_page_{page_num}.png"
-            if fidelity_settings.get('antiAliasing', False):
-                # Save with high quality and anti-aliasing
-                img.save(temp_file, "PNG", quality=100, optimize=False)
-            else:
-                img.save(temp_file, "PNG", quality=95)
-            
-            # Draw background image with exact scaling
-            pdf_canvas.drawImage(temp_file, 0, 0, pdf_width, pdf_height)
-            
-            try:
-                os.remove(temp_file)
-            except:
-                pass
-            
-            # EXACT POSITION MATCHING: Process annotations with perfect fidelity
-            page_annotations = [s for s in symbols if s.get('page', 0) == page_num]
-            print(f"🎯 Processing {len(page_annotations)} annotations with EXACT positioning")
-            
-            for annotation in page_annotations:
-                symbol_type = annotation.get('type', 'field_weld')
-                color = colors.get(symbol_type, (0, 0, 1))
-                
-                # EXACT VISUAL FIDELITY: Set drawing properties to match editor
-                pdf_canvas.setStrokeColorRGB(*color)
-                pdf_canvas.setFillColorRGB(*color)
-                pdf_canvas.setLineWidth(stroke_width_pdf)
-                
-                # ANCHOR POINT CONSISTENCY: Use exact same anchor points as editor
-                anchor_point = anchor_points.get(symbol_type, 'center')
-                
-                # EXACT COORDINATE TRANSFORMATION: No position shifting
-                if annotation.get('lineStart') and annotation.get('lineEnd'):
-                    line_start = annotation['lineStart']
-                    line_end = annotation['lineEnd']
-                    
-                    # EXACT positioning - use identical coordinate transformation as editor
-                    start_x = line_start['x'] * coord_scale_x
-                    start_y = pdf_height - (line_start['y'] * coord_scale_y)  # Exact Y-flip
-                    end_x = line_end['x'] * coord_scale_x
-                    end_y = pdf_height - (line_end['y'] * coord_scale_y)  # Exact Y-flip
-                    
-                    pdf_canvas.line(start_x, start_y, end_x, end_y)
-                
+        loop = asyncio.get_running_loop()
+        page_images = await loop.run_in_executor(
+            _get_pdf_pool(), _render_pages, str(source_path), [page_num]
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=500, detail=f"Error rendering page: {str(e)}"
+        )
+    if page_num not in page_images:
+        raise HTTPException(status_code=404, detail="Page image not found")
+
+    await _write_page_image(page_path, page_images[page_num])
+    return page_path
+
+
+def _page_number(name: str) -> int:
+    """Page index from a validated page image name"""
+    return int(PAGE_IMAGE_NAME.fullmatch(name).group(1))
+
+
+async def _write_page_image(page_path: Path, img_data: bytes):
+    """Write beside the final name and swap it in, so a page is never served
+    half-written"""
+    temp_path = page_path.with_name(f".{page_path.name}.{uuid.uuid4().hex}")
+    try:
+        async with aiofiles.open(temp_path, "wb") as page_file:
+            await page_file.write(img_data)
+        os.replace(temp_path, page_path)
+    except FileNotFoundError:
+        # The page set was evicted while this page was rendering
+        raise HTTPException(status_code=410, detail=PAGE_SET_EXPIRED)
+
+
+async def _render_missing_pages(file_id: str, page_nums: List[int]):
+    """Render never-viewed pages of one page set, one batch per pool worker"""
+    page_dir = UPLOAD_DIR / file_id
+    source_path = page_dir / SOURCE_PDF_NAME
+    if not page_dir.is_dir():
+        raise HTTPException(status_code=410, detail=PAGE_SET_EXPIRED)
+    if not source_path.is_file():
+        raise HTTPException(status_code=404, detail="Page image not found")
+
+    # Each worker opens the document once and rasterizes only its own missing
+    # pages; batches are runs of the sorted list, so pages close together stay
+    # on one worker
+    missing = sorted(set(page_nums))
+    batch_size = math.ceil(len(missing) / PDF_POOL_WORKERS)
+    batches = [
+        missing[i:i + batch_size] for i in range(0, len(missing), batch_size)
+    ]
+    try:
+        loop = asyncio.get_running_loop()
+        pool = _get_pdf_pool()
+        renders = await asyncio.gather(*(
+            loop.run_in_executor(pool, _render_pages, str(source_path), batch)
+            for batch in batches
+        ))
+    except Exception as e:
+        raise HTTPException(
+            status_code=500, detail=f"Error rendering page: {str(e)}"
+        )
+
+    rendered = 0
+    for page_images in renders:
+        for page_num, img_data in page_images.items():
+            page_path = page_dir / f"page_{page_num}.{PAGE_IMAGE_EXT}"
+            await _write_page_image(page_path, img_data)
+        rendered += len(page_images)
+    if rendered < len(missing):
+        # Asked for pages past the end of the document
+        raise HTTPException(status_code=404, detail="Page image not found")
+
+
+def _split_page_url(image: str) -> Optional[Tuple[str, str]]:
+    """(file_id, name) of a stored page URL, or None for a legacy inline
+    base64 image"""
+    if image.startswith(f"{PAGE_IMAGE_ROUTE}/"):
+        file_id, _, name = image[len(PAGE_IMAGE_ROUTE) + 1:].partition("/")
+        return file_id, name
+    return None
+
+
+def _export_page_size(image: str) -> Tuple[float, float]:
+    """Export page size in points, from the source PDF page (legacy pages:
+    from the 2x image)"""
+    page_url = _split_page_url(image)
+    if page_url:
+        page_path = _page_image_path(*page_url)
+        source_path = page_path.with_name(SOURCE_PDF_NAME)
+        if source_path.is_file():
+            page_num = _page_number(page_path.name)
+            with fitz.open(str(source_path)) as doc:
+                rect = doc.load_page(page_num).rect
+            return (
+                rect.width * EXPORT_PAGE_SCALE,
+                rect.height * EXPORT_PAGE_SCALE
+            )
+        image_file = page_path
+    else:
+        image_file = io.BytesIO(base64.b64decode(image))
+    with Image.open(image_file) as img:
+        return img.width * 0.75, img.height * 0.75
+
+
+def _page_image_source(image: str):
+    """ReportLab image source for a page: stored pages by path, legacy base64
+    from memory"""
+    page_url = _split_page_url(image)
+    if page_url:
+        # Given a path, ReportLab embeds stored JPEG pages without decoding
+        # them; HIGH_RES PNG pages still get decoded and recompressed
+        return str(_page_image_path(*page_url))
+    return ImageReader(io.BytesIO(base64.b64decode(image)))
+
+
+@app.get(PAGE_IMAGE_ROUTE + "/{file_id}/{name}")
+async def get_page_image(file_id: str, name: str):
+    """Serve a page image, rendering it on first request; pages never change
+    once written"""
+    return FileResponse(
+        await _ensure_page_image(file_id, name),
+        headers={"Cache-Control": "public, max-age=86400, immutable"}
+    )
+
+
+# Color mapping (exact same as editor), as ReportLab RGB fractions
+SYMBOL_COLORS = {
+    'field_weld': (0, 0.4, 1),      # Blue
+    'shop_weld': (0, 0.4, 1),       # Blue
+    'pipe_section': (0, 0.4, 1),    # Blue
+    'pipe_support': (1, 0, 0),      # Red
+    'flange_joint': (0, 0.4, 1)     # Blue
+}
+
+# Unit-size vertex templates, scaled and offset per symbol instead of
+# recomputing the geometry
+_DIAMOND_UNIT = ((0, 1), (1, 0), (0, -1), (-1, 0))  # Top, right, bottom, left
+_HEXAGON_UNIT = tuple(
+    (math.cos(i * math.pi / 3), math.sin(i * math.pi / 3)) for i in range(6)
+)
+
+
+def _draw_polygon(pdf_canvas, sym_x: float, sym_y: float, scale: float,
+                  unit_points):
+    """Stroke a closed polygon from a unit vertex template"""
+    path = pdf_canvas.beginPath()
+    (dx, dy), *rest = unit_points
+    path.moveTo(sym_x + dx * scale, sym_y + dy * scale)
+    for dx, dy in rest:
+        path.lineTo(sym_x + dx * scale, sym_y + dy * scale)
+    path.close()
+    pdf_canvas.drawPath(path, stroke=1, fill=0)
+
+
+def _draw_field_weld(pdf_canvas, sym_x: float, sym_y: float,
+                     uniform_size_pdf: float):
+    """Diamond - EXACT same as editor"""
+    _draw_polygon(
+        pdf_canvas, sym_x, sym_y, uniform_size_pdf * 0.8, _DIAMOND_UNIT
+    )
+
+
+def _draw_shop_weld(pdf_canvas, sym_x: float, sym_y: float,
+                    uniform_size_pdf: float):
+    """Circle - EXACT same as editor"""
+    radius = uniform_size_pdf * 0.35
+    pdf_canvas.circle(sym_x, sym_y, radius, stroke=1, fill=0)
+
+
+def _draw_pipe_section(pdf_canvas, sym_x: float, sym_y: float,
+                       uniform_size_pdf: float):
+    """Blue rounded rectangle - EXACT same as editor"""
+    width = uniform_size_pdf * 1.4
+    height = uniform_size_pdf * 0.7
+    pdf_canvas.roundRect(
+        sym_x - width/2, sym_y - height/2,
+        width, height,
+        4, stroke=1, fill=0
+    )
+
+
+def _draw_pipe_support(pdf_canvas, sym_x: float, sym_y: float,
+                       uniform_size_pdf: float):
+    """Red rectangle - EXACT same as editor"""
+    width = uniform_size_pdf * 1.4
+    height = uniform_size_pdf * 0.7
+    pdf_canvas.rect(
+        sym_x - width/2, sym_y - height/2,
+        width, height,
+        stroke=1, fill=0
+    )
+
+
+def _draw_flange_joint(pdf_canvas, sym_x: float, sym_y: float,
+                       uniform_size_pdf: float):
+    """Hexagon with line - EXACT same as editor"""
+    hex_radius = uniform_size_pdf/2 * 0.7
+    _draw_polygon(pdf_canvas, sym_x, sym_y, hex_radius, _HEXAGON_UNIT)
+
+    # Draw horizontal line inside - EXACT center positioning
+    line_length = uniform_size_pdf * 0.25
+    pdf_canvas.line(
+        sym_x - line_length, sym_y,
+        sym_x + line_length, sym_y
+    )
+
+
+# Symbol type -> ReportLab drawing routine, used to build each symbol's form
+# once per export
+SYMBOL_RENDERERS = {
+    'field_weld': _draw_field_weld,
+    'shop_weld': _draw_shop_weld,
+    'pipe_section': _draw_pipe_section,
+    'pipe_support': _draw_pipe_support,
+    'flange_joint': _draw_flange_joint
+}
+
+
+def _define_symbol_forms(pdf_canvas, uniform_size_pdf: float,
+                         stroke_width_pdf: float) -> Dict[str, str]:
+    """Draw each symbol type once, centered on the origin, as a reusable PDF
+    form XObject"""
+    # The diamond reaches furthest (0.8 x uniform size); pad for the stroke
+    extent = uniform_size_pdf + stroke_width_pdf
+    symbol_forms = {}
+    for symbol_type, draw_symbol in SYMBOL_RENDERERS.items():
+        form_name = f"symbol_{symbol_type}"
+        pdf_canvas.beginForm(
+            form_name,
+            lowerx=-extent, lowery=-extent, upperx=extent, uppery=extent
+        )
+
+        color = SYMBOL_COLORS[symbol_type]
+        pdf_canvas.setStrokeColorRGB(*color)
+        pdf_canvas.setFillColorRGB(*color)
+        pdf_canvas.setLineWidth(stroke_width_pdf)
+        draw_symbol(pdf_canvas, 0, 0, uniform_size_pdf)
+        pdf_canvas.endForm()
+        symbol_forms[symbol_type] = form_name
+    return symbol_forms
+
+
+def _build_export_pdf(export_data: dict, output_path: str):
+    """Build the annotated export PDF at output_path; blocking
+    ReportLab/Pillow work, run off the event loop"""
+    symbols = export_data.get('symbols', [])
+    images = export_data.get('images', [])
+    canvas_specs = export_data.get('canvasSpecs', {})
+    fidelity_settings = export_data.get('fidelitySettings', {})
+
+    logger.debug(
+        "Export started: %d symbols, %d pages, fidelity settings %s",
+        len(symbols), len(images), fidelity_settings
+    )
+
+    # EXACT RESOLUTION MATCHING: Size pages from the original drawing, not
+    # the raster
+    pdf_width, pdf_height = _export_page_size(images[0])
+
+    # EXACT SCALING: Match editor scaling exactly
+    if fidelity_settings.get('exactResolution', False):
+        # Use exact canvas dimensions from editor
+        canvas_width = canvas_specs.get('elementWidth', 800)
+        canvas_height = canvas_specs.get('elementHeight', 600)
+
+        # Use exact editor scale factors
+        editor_scale_x = canvas_specs.get('editorScaleX', 1.0)
+        editor_scale_y = canvas_specs.get('editorScaleY', 1.0)
+        device_pixel_ratio = canvas_specs.get('devicePixelRatio', 1.0)
+
+        # EXACT COORDINATE TRANSFORMATION: Match editor coordinate system
+        # exactly. Scale from canvas coordinates to PDF coordinates using
+        # EXACT same ratios
+        coord_scale_x = pdf_width / canvas_width
+        coord_scale_y = pdf_height / canvas_height
+
+        logger.debug(
+            "Exact resolution: canvas %sx%s, PDF %.1fx%.1f, "
+            "editor scale %.4fx%.4f, coord scale %.4fx%.4f, "
+            "device pixel ratio %s",
+            canvas_width, canvas_height, pdf_width, pdf_height,
+            editor_scale_x, editor_scale_y, coord_scale_x, coord_scale_y,
+            device_pixel_ratio
+        )
+
+    else:
+        # Fallback to standard scaling
+        canvas_width = canvas_specs.get('elementWidth', 800)
+        canvas_height = canvas_specs.get('elementHeight', 600)
+        coord_scale_x = pdf_width / canvas_width
+        coord_scale_y = pdf_height / canvas_height
+
+    pdf_canvas = canvas.Canvas(output_path, pagesize=(pdf_width, pdf_height))
+
+    # EXACT SHAPE SPECIFICATIONS: Match editor exactly
+    if fidelity_settings.get('matchEditorScaling', False):
+        # 20 pt base size, scaled to match editor uniform size
+        uniform_size_pdf = 20 * 0.8
+        stroke_width_pdf = 2  # Match editor stroke width
+    else:
+        uniform_size_pdf = 18 * 0.8
+        stroke_width_pdf = 1.5
+
+    # Symbols are identical apart from position, so each shape is written to
+    # the PDF once and every placement just references it
+    symbol_forms = _define_symbol_forms(
+        pdf_canvas, uniform_size_pdf, stroke_width_pdf
+    )
+
+    # Bucket annotations by page once instead of rescanning every symbol for
+    # every page
+    annotations_by_page = defaultdict(list)
+    for symbol in symbols:
+        annotations_by_page[symbol.get('page', 0)].append(symbol)
+
+    # Process each page with BEST VISUAL FIDELITY
+    for page_num, page_image in enumerate(images):
+        # Draw background image with exact scaling, straight from the page
+        # store or memory
+        pdf_canvas.drawImage(
+            _page_image_source(page_image), 0, 0, pdf_width, pdf_height
+        )
+
+        # EXACT POSITION MATCHING: Process annotations with perfect fidelity
+        page_annotations = annotations_by_page.get(page_num, ())
+
+        # Graphics state resets with every showPage, so the stroke width is
+        # set once per page
+        pdf_canvas.setLineWidth(stroke_width_pdf)
+
+        # Lead lines share one colour per symbol type, so each type's lines
+        # go out as a single path
+        annotations_by_type = defaultdict(list)
+        for annotation in page_annotations:
+            symbol_type = annotation.get('type', 'field_weld')
+            annotations_by_type[symbol_type].append(annotation)
+
+        for symbol_type, type_annotations in annotations_by_type.items():
+            # EXACT VISUAL FIDELITY: Set drawing properties to match editor
+            pdf_canvas.setStrokeColorRGB(
+                *SYMBOL_COLORS.get(symbol_type, (0, 0, 1))
+            )
+
+            # EXACT COORDINATE TRANSFORMATION: No position shifting, exact
+            # Y-flip
+            lead_lines = [
+                (
+                    annotation['lineStart']['x'] * coord_scale_x,
+                    pdf_height - annotation['lineStart']['y'] * coord_scale_y,
+                    annotation['lineEnd']['x'] * coord_scale_x,
+                    pdf_height - annotation['lineEnd']['y'] * coord_scale_y
+                )
+                for annotation in type_annotations
+                if annotation.get('lineStart') and annotation.get('lineEnd')
+            ]
+            if lead_lines:
+                pdf_canvas.lines(lead_lines)
+
+        # Symbols go on top of every lead line; each form carries its own
+        # colour
+        for symbol_type, type_annotations in annotations_by_type.items():
+            form_name = symbol_forms.get(symbol_type)
+            if not form_name:
+                continue
+
+            for annotation in type_annotations:
                 # EXACT SYMBOL POSITIONING: Perfect anchor point matching
                 symbol_pos = annotation.get('symbolPosition')
                 if symbol_pos:
-                    # EXACT coordinate transformation with consistent anchor points
-                    sym_x = symbol_pos['x'] * coord_scale_x
-                    sym_y = pdf_height - (symbol_pos['y'] * coord_scale_y)
-                    
-                    # BEST VISUAL FIDELITY: Render shapes with exact editor specifications
-                    if symbol_type == 'field_weld':
-                        # Diamond - EXACT same as editor
-                        size = uniform_size_pdf * 0.8
-                        points = [
-                            (sym_x, sym_y + size),      # Top
-                            (sym_x + size, sym_y),      # Right
-                            (sym_x, sym_y - size),      # Bottom
-                            (sym_x - size, sym_y)       # Left
-                        ]
-                        path = pdf_canvas.beginPath()
-                        path.moveTo(points[0][0], points[0][1])
-                        for point in points[1:]:
-                            path.lineTo(point[0], point[1])
-                        path.close()
-                        pdf_canvas.drawPath(path, stroke=1, fill=0)
-                        
-                    elif symbol_type == 'shop_weld':
-                        # Circle - EXACT same as editor
-                        radius = uniform_size_pdf * 0.35
-                        pdf_canvas.circle(sym_x, sym_y, radius, stroke=1, fill=0)
-                        
-                    elif symbol_type == 'pipe_section':
-                        # Blue rectangle - EXACT same as editor
-                        width = uniform_size_pdf * 1.4
-                        height = uniform_size_pdf * 0.7
-                        pdf_canvas.roundRect(
-                            sym_x - width/2, sym_y - height/2, 
-                            width, height, 
-                            4, stroke=1, fill=0
-                        )
-                        
-                    elif symbol_type == 'pipe_support':
-                        # Red rectangle - EXACT same as editor
-                        width = uniform_size_pdf * 1.4
-                        height = uniform_size_pdf * 0.7
-                        pdf_canvas.rect(
-                            sym_x - width/2, sym_y - height/2,
-                            width, height,
-                            stroke=1, fill=0
-                        )
-                        
-                    elif symbol_type == 'flange_joint':
-                        # Hexagon with line - EXACT same as editor
-                        hex_radius = uniform_size_pdf/2 * 0.7
-                        hex_points = []
-                        for i in range(6):
-                            angle = i * math.pi / 3
-                            px = sym_x + hex_radius * math.cos(angle)
-                            py = sym_y + hex_radius * math.sin(angle)
-                            hex_points.append((px, py))
-                        
-                        # Draw hexagon
-                        path = pdf_canvas.beginPath()
-                        path.moveTo(hex_points[0][0], hex_points[0][1])
-                        for point in hex_points[1:]:
-                            path.lineTo(point[0], point[1])
-                        path.close()
-                        pdf_canvas.drawPath(path, stroke=1, fill=0)
-                        
-                        # Draw horizontal line inside - EXACT center positioning
-                        line_length = uniform_size_pdf * 0.25
-                        pdf_canvas.line(
-                            sym_x - line_length, sym_y,
-                            sym_x + line_length, sym_y
-                        )
-                
-                print(f"✅ Perfect fidelity annotation {annotation.get('id')} positioned exactly")
-            
-            print(f"✅ Page {page_num + 1} completed with BEST VISUAL FIDELITY")
-            
-            # Add new page if not last
-            if page_num < len(images) - 1:
-                pdf_canvas.showPage()
-        
-        pdf_canvas.save()
-        buffer.seek(0)
-        
-        print("🎉 BEST VISUAL FIDELITY EXPORT COMPLETED SUCCESSFULLY")
-        print(f"📊 Export Summary:")
-        print(f"   📄 Pages: {len(images)}")
-        print(f"   📍 Annotations: {len(symbols)}")
-        print(f"   🎯 Fidelity Mode: {fidelity_settings.get('bestVisualFidelity', False)}")
-        print(f"   📐 Resolution: {pdf_width:.1f}x{pdf_height:.1f}")
-        
-        return Response(
-            content=buffer.getvalue(),
+                    pdf_canvas.saveState()
+                    pdf_canvas.translate(
+                        symbol_pos['x'] * coord_scale_x,
+                        pdf_height - (symbol_pos['y'] * coord_scale_y)
+                    )
+                    pdf_canvas.doForm(form_name)
+                    pdf_canvas.restoreState()
+
+        # Add new page if not last
+        if page_num < len(images) - 1:
+            pdf_canvas.showPage()
+
+    pdf_canvas.save()
+
+    logger.debug(
+        "Export completed: %d pages, %d annotations at %.1fx%.1f",
+        len(images), len(symbols), pdf_width, pdf_height
+    )
+
+
+@app.post("/api/export-pdf")
+async def export_pdf_best_fidelity(export_data: dict):
+    """BEST VISUAL FIDELITY: Export PDF with exact editor matching - NO
+    position shifting"""
+    filename = export_data.get('filename', 'weld_mapping_high_fidelity')
+    if not export_data.get('images'):
+        raise HTTPException(status_code=400, detail="No images to export")
+
+    # Pages the editor never displayed haven't been rendered yet
+    missing_pages = defaultdict(list)
+    page_sets = set()
+    for image in export_data['images']:
+        page_url = _split_page_url(image)
+        if not page_url:
+            continue
+        page_path = _page_image_path(*page_url)
+        page_sets.add(page_path.parent)
+        if not page_path.is_file():
+            file_id, name = page_url
+            if not page_path.parent.is_dir():
+                raise HTTPException(status_code=410, detail=PAGE_SET_EXPIRED)
+            if not name.endswith(f".{PAGE_IMAGE_EXT}"):
+                raise HTTPException(
+                    status_code=404, detail="Page image not found"
+                )
+            missing_pages[file_id].append(_page_number(name))
+    # Exporting a drawing counts as using it
+    for page_dir in page_sets:
+        _touch_page_set(page_dir)
+    await asyncio.gather(*(
+        _render_missing_pages(file_id, page_nums)
+        for file_id, page_nums in missing_pages.items()
+    ))
+
+    # The export is written to disk and streamed from there, so the response
+    # never holds a copy of it
+    export_fd, export_path = tempfile.mkstemp(suffix=".pdf")
+    os.close(export_fd)
+    try:
+        # Page decoding and drawing would otherwise stall every other request
+        await asyncio.to_thread(_build_export_pdf, export_data, export_path)
+
+        return FileResponse(
+            export_path,
             media_type="application/pdf",
-            headers={"Content-Disposition": f"attachment; filename={filename}.pdf"}
+            headers={
+                "Content-Disposition": f"attachment; filename={filename}.pdf"
+            },
+            background=BackgroundTask(os.remove, export_path)
         )
-        
+
     except Exception as e:
-        print(f"❌ BEST VISUAL FIDELITY EXPORT ERROR: {str(e)}")
-        import traceback
-        traceback.print_exc()
-        raise HTTPException(status_code=500, detail=f"High Fidelity Export error: {str(e)}")
+        os.remove(export_path)
+        logger.exception("PDF export failed")
+        raise HTTPException(
+            status_code=500, detail=f"High Fidelity Export error: {str(e)}"
+        )
+
 
 @app.post("/api/export-annotations")
 async def export_annotations(annotations_data: dict):
@@ -363,14 +807,20 @@ async def export_annotations(annotations_data: dict):
     try:
         # This endpoint could be used to generate final annotated PDFs
         # For now, frontend handles export via canvas
-        return JSONResponse({
+        return ORJSONResponse({
             "success": True,
             "message": "Annotations data received",
             "symbols_count": len(annotations_data.get("symbols", []))
         })
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error exporting annotations: {str(e)}")
+        raise HTTPException(
+            status_code=500, detail=f"Error exporting annotations: {str(e)}"
+        )
+
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8001)
+    # Several workers let concurrent uploads and exports use more than one core
+    uvicorn.run(
+        "server:app", host="0.0.0.0", port=8001, workers=WEB_CONCURRENCY
+    )
@@ -143,19 +143,31 @@ startxref
             
             if success:
                 data = response.json()
-                required_keys = ["success", "file_id", "filename", "total_pages", "images"]
+                required_keys = ["success", "file_id", "filename", "total_pages", "image_urls"]
                 has_keys = all(key in data for key in required_keys)
                 
                 if has_keys:
                     success = (
                         data.get("success") == True and
                         data.get("total_pages") > 0 and
-                        len(data.get("images", [])) > 0
+                        len(data.get("image_urls", [])) > 0
                     )
-                    details = f"- Pages: {data.get('total_pages')}, Images: {len(data.get('images', []))}"
+                    details = f"- Pages: {data.get('total_pages')}, Images: {len(data.get('image_urls', []))}"
+                    
+                    # Pages are served separately - make sure the first one resolves to an image
+                    if success:
+                        page_response = self.session.get(
+                            f"{self.base_url}{data['image_urls'][0]}",
+                            timeout=30
+                        )
+                        success = (
+                            page_response.status_code == 200 and
+                            page_response.headers.get("content-type", "").startswith("image/")
+                        )
+                        details += f", First page: {page_response.status_code}"
                     
                     # Store for later tests
-                    self.test_images = data.get("images", [])
+                    self.test_images = data.get("image_urls", [])
                     self.test_filename = data.get("filename", "test_drawing.pdf")
                 else:
                     success = False
@@ -168,6 +180,74 @@ startxref
         except Exception as e:
             return self.log_test("PDF Upload", False, f"- Error: {str(e)}")
 
+    def test_raw_pdf_upload(self):
+        """Test raw-body PDF upload (the route the UI uses), lazy page rendering and the content-hash cache"""
+        try:
+            pdf_content = self.create_test_pdf()
+            upload_url = f"{self.base_url}/api/upload-pdf-raw"
+            headers = {'Content-Type': 'application/pdf'}
+
+            response = self.session.post(
+                upload_url,
+                params={'filename': 'test_drawing_raw.pdf'},
+                data=pdf_content,
+                headers=headers,
+                timeout=30
+            )
+
+            if response.status_code != 200:
+                details = f"- Status Code: {response.status_code}, Response: {response.text[:200]}"
+                return self.log_test("Raw PDF Upload", False, details)
+
+            data = response.json()
+            image_urls = data.get("image_urls", [])
+            success = (
+                data.get("success") == True and
+                data.get("total_pages") == len(image_urls) and
+                len(image_urls) > 0
+            )
+            details = f"- Pages: {data.get('total_pages')}"
+
+            # Pages render on first request, so every one of them must come back as an image
+            for image_url in image_urls:
+                page_response = self.session.get(f"{self.base_url}{image_url}", timeout=30)
+                if not (
+                    page_response.status_code == 200 and
+                    page_response.headers.get("content-type", "").startswith("image/")
+                ):
+                    success = False
+                    details += f", {image_url}: {page_response.status_code}"
+
+            # Re-uploading the same drawing must hit the render cache
+            repeat_response = self.session.post(
+                upload_url,
+                params={'filename': 'test_drawing_raw.pdf'},
+                data=pdf_content,
+                headers=headers,
+                timeout=30
+            )
+            same_file_id = (
+                repeat_response.status_code == 200 and
+                repeat_response.json().get("file_id") == data.get("file_id")
+            )
+            success = success and same_file_id
+            details += f", Re-upload same file_id: {same_file_id}"
+
+            # The filename query parameter is required
+            missing_name_response = self.session.post(
+                upload_url,
+                data=pdf_content,
+                headers=headers,
+                timeout=30
+            )
+            success = success and missing_name_response.status_code == 422
+            details += f", Missing filename: {missing_name_response.status_code}"
+
+            return self.log_test("Raw PDF Upload", success, details)
+
+        except Exception as e:
+            return self.log_test("Raw PDF Upload", False, f"- Error: {str(e)}")
+
     def test_pdf_export(self):
         """Test NEW PDF export with symbols functionality"""
         try:
@@ -356,6 +436,7 @@ startxref
         tests = [
             ("Health Check", self.test_health_check),
             ("PDF Upload", self.test_pdf_upload),
+            ("Raw PDF Upload", self.test_raw_pdf_upload),
             ("PDF Export with Symbols", self.test_pdf_export),
             ("Export Annotations", self.test_export_annotations),
             ("Invalid Requests", self.test_invalid_requests)
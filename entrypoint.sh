@@ -5,8 +5,8 @@ set -e
 cd /backend || { echo "Backend directory not found"; exit 1; }
 
 echo "Starting FastAPI backend"
-# Start Uvicorn with proper host binding
-uvicorn server:app --host 0.0.0.0 --port 8001 &
+# Start Uvicorn with proper host binding; server.py sizes its render pool from the same WEB_CONCURRENCY default
+uvicorn server:app --host 0.0.0.0 --port 8001 --workers "${WEB_CONCURRENCY:-2}" &
 BACKEND_PID=$!
 
 echo "Waiting for backend to start..."
@@ -3,6 +3,15 @@ import './App.css';
 
 const API_BASE_URL = process.env.REACT_APP_BACKEND_URL || 'http://localhost:8001';
 
+// Pages are served by URL; projects saved before that hold inline base64 JPEG/PNG
+const pageImageSrc = (image) => {
+  if (image.startsWith('/api/')) {
+    return `${API_BASE_URL}${image}`;
+  }
+  const mimeType = image.startsWith('/9j/') ? 'image/jpeg' : 'image/png';
+  return `data:${mimeType};base64,${image}`;
+};
+
 function App() {
   const [selectedFile, setSelectedFile] = useState(null);
   const [isProcessing, setIsProcessing] = useState(false);
@@ -143,13 +152,15 @@ function App() {
     setIsProcessing(true);
     setError(null);
 
-    const formData = new FormData();
-    formData.append('file', selectedFile);
-
     try {
-      const response = await fetch(`${API_BASE_URL}/api/upload-pdf-only`, {
+      // Send the PDF as the raw body so the backend can stream it straight to disk
+      const uploadUrl = `${API_BASE_URL}/api/upload-pdf-raw?filename=${encodeURIComponent(selectedFile.name)}`;
+      const response = await fetch(uploadUrl, {
         method: 'POST',
-        body: formData,
+        headers: {
+          'Content-Type': 'application/pdf',
+        },
+        body: selectedFile,
       });
 
       if (!response.ok) {
@@ -157,7 +168,7 @@ function App() {
       }
 
       const data = await response.json();
-      setPdfImages(data.images);
+      setPdfImages(data.image_urls);
       setCurrentPage(0);
       setPlacedSymbols([]);
       setSelectedSymbolId(null);
@@ -427,9 +438,32 @@ function App() {
     alert(`Project "${project.name}" saved successfully!`);
   };
 
-  const loadProject = (projectId) => {
+  // Saved projects point at pages in the server's page cache, which can expire;
+  // returns an error message when they are gone, null when they can be shown
+  const checkProjectPages = async (images) => {
+    if (!images.length || !images[0].startsWith('/api/')) return null;
+
+    try {
+      const response = await fetch(pageImageSrc(images[0]));
+      if (response.ok) return null;
+      const data = await response.json().catch(() => ({}));
+      return data.detail || 'The pages for this project are no longer available. Re-upload the PDF, then load the project again.';
+    } catch (error) {
+      return `Failed to load project pages: ${error.message}`;
+    }
+  };
+
+  const loadProject = async (projectId) => {
     const project = savedProjects.find(p => p.id.toString() === projectId);
     if (project) {
+      const pagesError = await checkProjectPages(project.pdfImages);
+      if (pagesError) {
+        setShowLoadDialog(false);
+        setError(pagesError);
+        return;
+      }
+
+      setError(null);
       setPlacedSymbols(project.symbols);
       setPdfImages(project.pdfImages);
       setCurrentPage(0);
@@ -621,7 +655,13 @@ function App() {
 
       if (!response.ok) {
         const errorText = await response.text();
-        throw new Error(`High Fidelity Export failed: ${response.status} - ${errorText}`);
+        let detail = errorText;
+        try {
+          detail = JSON.parse(errorText).detail || errorText;
+        } catch (parseError) {
+          // Not JSON; show the raw body
+        }
+        throw new Error(`High Fidelity Export failed: ${response.status} - ${detail}`);
       }
 
       const blob = await response.blob();
@@ -906,7 +946,7 @@ function App() {
                       onMouseMove={handleMouseMove}
                       onMouseUp={handleCanvasMouseUp}
                       style={{
-                        backgroundImage: pdfImages[currentPage] ? `url(data:image/png;base64,${pdfImages[currentPage]})` : 'none',
+                        backgroundImage: pdfImages[currentPage] ? `url(${pageImageSrc(pdfImages[currentPage])})` : 'none',
                         backgroundSize: `${100 * zoomLevel}%`,
                         backgroundRepeat: 'no-repeat',
                         backgroundPosition: `${panOffset.x}px ${panOffset.y}px`,
@@ -0,0 +1,93 @@
+"""
+Render cache tests: page sets in use survive eviction, evicted ones ask for a re-upload
+"""
+
+import io
+import os
+import sys
+from pathlib import Path
+
+import pytest
+from PIL import Image
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+import server  # noqa: E402
+
+
+def make_page_set(upload_dir: Path, file_id: str, mtime: float) -> str:
+    """Create a stored page set with one rendered page, last used at mtime"""
+    page_dir = upload_dir / file_id
+    page_dir.mkdir()
+    page = io.BytesIO()
+    Image.new("RGB", (200, 100), "white").save(page, "PNG")
+    (page_dir / "page_0.png").write_bytes(page.getvalue())
+    os.utime(page_dir, (mtime, mtime))
+    return f"{server.PAGE_IMAGE_ROUTE}/{file_id}/page_0.png"
+
+
+@pytest.fixture
+def page_sets(tmp_path, monkeypatch):
+    monkeypatch.setattr(server, "UPLOAD_DIR", tmp_path)
+    monkeypatch.setattr(server, "RENDER_CACHE_MAX_DOCS", 1)
+    # The drawing being worked on was uploaded first; a newer upload arrived since
+    active_url = make_page_set(tmp_path, "a" * 64, 1_000_000)
+    newer_url = make_page_set(tmp_path, "b" * 64, 2_000_000)
+    return tmp_path, active_url, newer_url
+
+
+def test_page_request_keeps_page_set_cached(page_sets):
+    upload_dir, active_url, _ = page_sets
+
+    response = TestClient(server.app).get(active_url)
+    assert response.status_code == 200
+
+    server._evict_render_cache()
+    assert (upload_dir / ("a" * 64)).is_dir()
+    assert not (upload_dir / ("b" * 64)).exists()
+
+
+def test_export_keeps_page_set_cached(page_sets):
+    upload_dir, active_url, _ = page_sets
+
+    response = TestClient(server.app).post(
+        "/api/export-pdf",
+        json={"filename": "active", "symbols": [], "images": [active_url]}
+    )
+    assert response.status_code == 200
+
+    server._evict_render_cache()
+    assert (upload_dir / ("a" * 64)).is_dir()
+    assert not (upload_dir / ("b" * 64)).exists()
+
+
+def test_evicted_page_set_asks_for_reupload(tmp_path, monkeypatch):
+    monkeypatch.setattr(server, "UPLOAD_DIR", tmp_path)
+    client = TestClient(server.app)
+    # Saved projects can hold page URLs from either render format
+    evicted_urls = [f"{server.PAGE_IMAGE_ROUTE}/{'c' * 64}/page_0.{ext}" for ext in ("jpg", "png")]
+
+    for evicted_url in evicted_urls:
+        response = client.get(evicted_url)
+        assert response.status_code == 410
+        assert response.json()["detail"] == server.PAGE_SET_EXPIRED
+
+        response = client.post(
+            "/api/export-pdf",
+            json={"filename": "evicted", "symbols": [], "images": [evicted_url]}
+        )
+        assert response.status_code == 410
+        assert response.json()["detail"] == server.PAGE_SET_EXPIRED
+
+
+def test_render_pages_only_renders_listed_pages(tmp_path):
+    pdf_path = tmp_path / server.SOURCE_PDF_NAME
+    with server.fitz.open() as doc:
+        for _ in range(4):
+            doc.new_page(width=200, height=100)
+        doc.save(pdf_path)
+
+    page_images = server._render_pages(str(pdf_path), [0, 2, 9])
+    assert sorted(page_images) == [0, 2]